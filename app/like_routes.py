@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, Response
 import asyncio
+import atexit
+import os
+import time
 from datetime import datetime, timezone
 import logging
-import aiohttp 
+import threading
+import httpx
+import orjson
+from cachetools import TTLCache
 
 from .utils.protobuf_utils import encode_uid, create_protobuf 
 from .utils.crypto_utils import encrypt_aes
-from .token_manager import get_headers 
 
 logger = logging.getLogger(__name__)
 
@@ -14,116 +19,248 @@ like_bp = Blueprint('like_bp', __name__)
 
 _SERVERS = {}
 _token_cache = None
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
 
-async def async_post_request(url: str, data: bytes, token: str):
+# One long-lived event loop on a daemon thread for all like fan-outs.
+# Flask's async_to_sync spins up (and tears down) a fresh loop per request,
+# which defeats a loop-bound shared ClientSession; a persistent loop
+# amortizes loop setup and keeps the session/semaphore on a single loop.
+_loop: asyncio.AbstractEventLoop | None = None
+
+def _run_async(coro, timeout):
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result(timeout)
+
+# Cap in-flight POSTs so large token pools don't thrash the connector's
+# wait queue (sized to match limit_per_host by default).
+_LIKE_CONCURRENCY = int(os.getenv("LIKE_CONCURRENCY", "64"))
+_like_sem: asyncio.Semaphore | None = None
+_like_sem_loop: asyncio.AbstractEventLoop | None = None
+
+def _get_like_sem() -> asyncio.Semaphore:
+    # Like the shared client, an asyncio.Semaphore binds to the loop that
+    # first awaits it; recreate it if the running loop has changed.
+    global _like_sem, _like_sem_loop
+    loop = asyncio.get_running_loop()
+    if _like_sem is None or _like_sem_loop is not loop:
+        _like_sem_loop = loop
+        _like_sem = asyncio.Semaphore(_LIKE_CONCURRENCY)
+    return _like_sem
+
+# Encrypted like payloads keyed by (uid, region): clients re-liking the
+# same UID within the TTL skip the protobuf + AES work entirely. 30s
+# matches typical client retry windows without holding payloads forever.
+_payload_cache = TTLCache(maxsize=4096, ttl=30)
+_payload_lock = threading.Lock()
+
+def _like_payload(uid: str, region: str) -> bytes:
+    key = (uid, region)
+    with _payload_lock:
+        payload = _payload_cache.get(key)
+    if payload is None:
+        payload = encrypt_aes(create_protobuf(uid, region))
+        with _payload_lock:
+            _payload_cache[key] = payload
+    return payload
+
+def _json(payload, status=200):
+    # orjson is several times faster than Flask's stdlib-json jsonify for
+    # these small fixed-schema dicts.
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+# The /like success body has a fixed schema, so skip dict+JSON encoding on
+# the hot path entirely: substitute into a prebuilt byte template. The UID
+# is validated to be pure digits before it reaches this, so no escaping is
+# needed.
+_LIKE_TMPL = (b'{"player":"Unknown","uid":"%b","likes_added":%d,'
+              b'"likes_before":0,"likes_after":%d,"server_used":"BR",'
+              b'"status":%d,"credits":"https://t.me/nopethug"}')
+
+# Static error responses never change — build them once at import time.
+_err_invalid_uid = Response(orjson.dumps({
+    "error": "Invalid UID",
+    "message": "Valid numeric UID required",
+    "status": 400,
+    "credits": "https://t.me/nopethug"
+}), status=400, mimetype='application/json')
+_err_no_tokens = Response(orjson.dumps({
+    "error": "No valid tokens",
+    "message": "No tokens available for BR. Check /health-check.",
+    "status": 404,
+    "credits": "https://t.me/nopethug"
+}), status=404, mimetype='application/json')
+
+def _get_client() -> httpx.AsyncClient:
+    # Shared HTTP/2 client: all N likes to the same host multiplex over a
+    # single TLS connection instead of opening one socket per POST.
+    # The client's connections are bound to the loop they were opened on, so
+    # rebuild it if we are ever called from a different loop — otherwise
+    # every POST after a loop change fails with a closed-loop error.
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client_loop = loop
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=300,
+            ),
+            timeout=httpx.Timeout(10.0, connect=2.0, read=5.0),
+        )
+    return _client
+
+async def close_session():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+async def async_post_request(url: str, data: bytes, headers) -> bool:
     try:
-        headers = get_headers(token)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data, headers=headers, timeout=10) as resp:
-                return await resp.read()
-    except Exception as e:
-        logger.error(f"Async request failed: {str(e)}")
-        return None
+        async with _get_like_sem():
+            resp = await _get_client().post(url, content=data, headers=headers)
+            # Only the status matters; the body is discarded.
+            return resp.status_code < 400
+    except (httpx.HTTPError, asyncio.TimeoutError) as e:
+        # Transient network failures are expected in a fan-out; log cheaply
+        # without materializing a traceback. Anything else is a bug and
+        # should propagate.
+        logger.debug("post failed: %s", e)
+        return False
 
 async def send_likes(uid: str, region: str = "BR"):
     tokens = _token_cache.get_tokens(region)
     if not tokens:
-        logger.warning(f"No tokens for {region}, cannot send likes.")
+        logger.warning("No tokens for %s, cannot send likes.", region)
         return {'sent': 0, 'added': 0}
-    
+    headers_list = _token_cache.get_headers_for(region)
+
     like_url = f"{_SERVERS[region]}/LikeProfile"
-    encrypted = encrypt_aes(create_protobuf(uid, region))
+    payload = _like_payload(uid, region)
+
+    tasks = [asyncio.create_task(async_post_request(like_url, payload, headers))
+             for headers in headers_list]
 
-    tasks = [async_post_request(like_url, bytes.fromhex(encrypted), token) for token in tokens]
-    results = await asyncio.gather(*tasks)
+    added = 0
+    try:
+        async with asyncio.timeout(12):
+            for fut in asyncio.as_completed(tasks):
+                added += await fut
+    except TimeoutError:
+        logger.warning("Like fan-out for UID %s hit the 12s deadline, cancelling stragglers.", uid)
+        for task in tasks:
+            task.cancel()
 
-    added = sum(1 for r in results if r is not None)
-    logger.info(f"Sent {len(results)} likes to UID {uid} on {region}, successful: {added}")
+    logger.info("Sent %d likes to UID %s on %s, successful: %d", len(tasks), uid, region, added)
 
     return {
-        'sent': len(results),
+        'sent': len(tasks),
         'added': added
     }
 
 @like_bp.route("/like", methods=["GET"])
-async def like_player():
+def like_player():
     try:
         uid = request.args.get("uid")
-        if not uid or not uid.isdigit():
-            return jsonify({
-                "error": "Invalid UID",
-                "message": "Valid numeric UID required",
-                "status": 400,
-                "credits": "https://t.me/nopethug"
-            }), 400
+        # Single combined check with cheap length bounds before the C-level
+        # isdigit scan; Free Fire UIDs are 3-15 digits.
+        if not (uid and 3 <= len(uid) <= 15 and uid.isdigit()):
+            return _err_invalid_uid
 
         # FIXED: Skip detection, hardcoded BR region, no profile fetch
         region = "BR"  # Use BR as default (has tokens)
         tokens = _token_cache.get_tokens(region)
         if not tokens:
-            return jsonify({
-                "error": "No valid tokens",
-                "message": "No tokens available for BR. Check /health-check.",
-                "status": 404,
-                "credits": "https://t.me/nopethug"
-            }), 404
+            return _err_no_tokens
 
         # Assume before_likes = 0 (no fetch), likes_added = successful sends
-        likes_added = (await send_likes(uid, region))['added']
-        likes_before = 0  # Simplified, no fetch
-        likes_after = likes_added
-
-        return jsonify({
-            "player": "Unknown",  # No profile fetch
-            "uid": uid,
-            "likes_added": likes_added,
-            "likes_before": likes_before,
-            "likes_after": likes_after,
-            "server_used": region,
-            "status": 1 if likes_added > 0 else 2,
-            "credits": "https://t.me/nopethug"
-        })
+        likes_added = _run_async(send_likes(uid, region), timeout=15)['added']
+
+        body = _LIKE_TMPL % (uid.encode(), likes_added, likes_added,
+                             1 if likes_added > 0 else 2)
+        return Response(body, mimetype='application/json')
 
     except Exception as e:
-        logger.error(f"Like error for UID {uid}: {str(e)}", exc_info=True)
-        return jsonify({
+        logger.error("Like error for UID %s: %s", uid, e, exc_info=True)
+        return _json({
             "error": "Internal server error",
             "message": str(e),
             "status": 500,
             "credits": "https://t.me/nopethug"
-        }), 500
+        }, status=500)
+
+# Liveness probes can arrive many times a second; recompute at most once
+# per second and serve the cached payload in between.
+_health_cache = (0.0, None)
+
+# ISO timestamp cached at second granularity — probes within the same
+# second reuse the formatted string instead of allocating a datetime.
+_last_ts_sec = 0
+_last_ts_str = ''
+
+def _utc_now_iso() -> str:
+    global _last_ts_sec, _last_ts_str
+    now = int(time.time())
+    if now != _last_ts_sec:
+        _last_ts_sec = now
+        _last_ts_str = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    return _last_ts_str
 
 @like_bp.route("/health-check", methods=["GET"])
 def health_check():
+    global _health_cache
     try:
+        ts, cached = _health_cache
+        if cached is not None and time.monotonic() - ts < 1.0:
+            return Response(cached, mimetype='application/json')
+
+        # Reflect current cache state only — a health probe should never
+        # take the refresh lock or trigger a token refresh.
         token_status = {
-            server: len(_token_cache.get_tokens(server)) > 0 
-            for server in _SERVERS 
+            server: len(_token_cache.cache.get(server, [])) > 0
+            for server in _SERVERS
         }
 
-        return jsonify({
+        payload = {
             "status": "healthy" if all(token_status.values()) else "degraded",
             "servers": token_status,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": _utc_now_iso(),
             "credits": "https://t.me/nopethug"
-        })
+        }
+        body = orjson.dumps(payload)
+        _health_cache = (time.monotonic(), body)
+        return Response(body, mimetype='application/json')
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return jsonify({
+        logger.error("Health check failed: %s", e)
+        return _json({
             "status": "unhealthy",
             "error": str(e),
             "credits": "https://t.me/nopethug"
-        }), 500
+        }, status=500)
 
-@like_bp.route("/", methods=["GET"]) 
-async def root_home():
-    return jsonify({
+@like_bp.route("/", methods=["GET"])
+def root_home():
+    return _json({
         "message": "Api free fire like (Simplified: Direct BR likes, no profile)",
         "credits": "https://t.me/nopethug",
     })
 
 def initialize_routes(app_instance, servers_config, token_cache_instance):
-    global _SERVERS, _token_cache 
+    global _SERVERS, _token_cache, _loop
     _SERVERS = servers_config
     _token_cache = token_cache_instance
+    _token_cache.start_background_refresh()
+    _loop = asyncio.new_event_loop()
+    threading.Thread(target=_loop.run_forever, daemon=True,
+                     name="like-fanout-loop").start()
     app_instance.register_blueprint(like_bp)
+
+    @atexit.register
+    def _close_shared_session():
+        if _client is not None and not _client.is_closed:
+            try:
+                _run_async(close_session(), timeout=5)
+            except Exception:
+                pass
@@ -1,12 +1,23 @@
 # app/token_manager.py
 import os
-import json
+import asyncio
+import random
 import threading
 import time
 import logging
-import requests
+import aiohttp
+import orjson
 from cachetools import TTLCache
+from collections import defaultdict
 from datetime import timedelta
+from multidict import CIMultiDict
+
+from .protobuf import creds_pb2
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for .pb.zst configs
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
@@ -17,81 +28,205 @@ TOKEN_REFRESH_THRESHOLD = timedelta(hours=6).seconds
 class TokenCache:
     def __init__(self, servers_config):
         self.cache = TTLCache(maxsize=100, ttl=CACHE_DURATION)
+        self.headers_cache = {}
         self.last_refresh = {}
-        self.lock = threading.Lock()
-        self.session = requests.Session()
+        self._inflight = {}
+        # One lock per server so a slow refresh for one region never blocks
+        # warm reads for another; the meta-lock only guards lazy lock init.
+        self._meta_lock = threading.Lock()
+        self._locks = defaultdict(threading.Lock)
+        # Parsed credentials per server: (source mtime, creds). Env-sourced
+        # creds use a sentinel mtime since the environment doesn't change
+        # at runtime; file-sourced creds are re-read when the file does.
+        self._creds_cache = {}
         self.servers_config = servers_config
+        # Dedicated loop thread so refreshes can fan out with aiohttp even
+        # when the caller is a plain (sync) Flask thread.
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True,
+                         name="token-refresh-loop").start()
+
+    def _lock_for(self, server_key):
+        with self._meta_lock:
+            return self._locks[server_key]
 
     def get_tokens(self, server_key):
-        with self.lock:
-            now = time.time()
-            refresh_needed = (
-                    server_key not in self.cache or
-                    server_key not in self.last_refresh or
-                    (now - self.last_refresh.get(server_key, 0)) > TOKEN_REFRESH_THRESHOLD
-            )
-
-            if refresh_needed:
+        # Hot path: the background refresher keeps the cache warm, so this
+        # is a lockless read — the token list is replaced wholesale on
+        # refresh, never mutated in place, and dict gets are GIL-protected.
+        tokens = self.cache.get(server_key)
+        if tokens is not None:
+            return tokens
+
+        lock = self._lock_for(server_key)
+        with lock:
+            if server_key in self.cache:
+                return self.cache.get(server_key, [])
+            # First-ever hit before the refresher has populated this server:
+            # fall back to an inline, single-flight refresh.
+            wait_event = self._inflight.get(server_key)
+            if wait_event is None:
+                self._inflight[server_key] = threading.Event()
+                self.last_refresh[server_key] = time.time()
+
+        if wait_event is not None:
+            # Another caller is already refreshing; piggyback on its result.
+            wait_event.wait(timeout=30)
+        else:
+            try:
                 self._refresh_tokens(server_key)
-                self.last_refresh[server_key] = now
+            finally:
+                with lock:
+                    self._inflight.pop(server_key).set()
+
+        return self.cache.get(server_key, [])
+
+    def start_background_refresh(self):
+        """Kick off the periodic refresher on the background loop."""
+        asyncio.run_coroutine_threadsafe(self._refresher_loop(), self._loop)
+
+    async def _refresher_loop(self):
+        while True:
+            try:
+                results = await asyncio.gather(
+                    *(self._refresh_tokens_async(server_key)
+                      for server_key in self.servers_config),
+                    return_exceptions=True)
+                for server_key, result in zip(self.servers_config, results):
+                    if isinstance(result, BaseException):
+                        logger.error("Background refresh failed for %s: %r", server_key, result)
+                now = time.time()
+                for server_key in self.servers_config:
+                    with self._lock_for(server_key):
+                        self.last_refresh[server_key] = now
+            except Exception as e:
+                logger.error("Background token refresh failed: %s", e)
+            # Refresh at half the threshold, with ±10% jitter so restarts of
+            # several instances don't align their refresh bursts.
+            await asyncio.sleep((TOKEN_REFRESH_THRESHOLD // 2) * random.uniform(0.9, 1.1))
 
-            return self.cache.get(server_key, [])
+    def get_headers_for(self, server_key):
+        """Prebuilt header dicts, one per cached token, in the same order as get_tokens."""
+        return self.headers_cache.get(server_key, [])
 
     def _refresh_tokens(self, server_key):
+        """Sync shim: run the async refresh on the background loop and wait."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._refresh_tokens_async(server_key), self._loop)
+        try:
+            future.result(timeout=30)
+        except Exception as e:
+            logger.error("Critical error during token refresh for %s: %s", server_key, e)
+            with self._lock_for(server_key):
+                if server_key not in self.cache:
+                    self.cache[server_key] = []
+                    self.headers_cache[server_key] = []
+
+    async def _fetch_token(self, session, user, server_key):
+        try:
+            params = {'uid': user['uid'], 'password': user['password']}
+            async with session.get(AUTH_URL, params=params) as response:
+                if response.status == 200:
+                    return orjson.loads(await response.read()).get("token")
+                logger.warning("Failed to fetch token for %s (server %s): Status %s, Response: %s",
+                               user['uid'], server_key, response.status,
+                               (await response.text()) if logger.isEnabledFor(logging.WARNING) else '')
+        except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+            logger.debug("Error fetching token for %s (server %s): %s", user['uid'], server_key, e)
+        return None
+
+    async def _refresh_tokens_async(self, server_key):
         if server_key == "IND":
-            logger.warning(f"IND region not supported by current JWT generator ({AUTH_URL}). No tokens for IND. Generate your own API for IND.")
-            self.cache[server_key] = []
+            logger.warning("IND region not supported by current JWT generator (%s). No tokens for IND. Generate your own API for IND.", AUTH_URL)
+            with self._lock_for(server_key):
+                self.cache[server_key] = []
+                self.headers_cache[server_key] = []
             return
 
-        try:
-            creds = self._load_credentials(server_key)
-            tokens = []
+        creds = self._load_credentials(server_key)
 
-            for user in creds:
-                try:
-                    params = {'uid': user['uid'], 'password': user['password']}
-                    response = self.session.get(AUTH_URL, params=params, timeout=5)
-                    if response.status_code == 200:
-                        token = response.json().get("token")
-                        if token:
-                            tokens.append(token)
-                    else:
-                        logger.warning(f"Failed to fetch token for {user['uid']} (server {server_key}): Status {response.status_code}, Response: {response.text}")
-                except Exception as e:
-                    logger.error(f"Error fetching token for {user['uid']} (server {server_key}): {str(e)}")
-                    continue
+        # Fan the credential list out in parallel: wall clock is the slowest
+        # single fetch instead of the sum of all of them.
+        async with aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=5)) as session:
+            results = await asyncio.gather(
+                *(self._fetch_token(session, user, server_key) for user in creds),
+                return_exceptions=True)
 
+        tokens = []
+        for user, result in zip(creds, results):
+            if isinstance(result, str) and result:
+                tokens.append(result)
+            elif isinstance(result, BaseException):
+                # Anything _fetch_token didn't handle itself — e.g. a
+                # KeyError from a malformed credential entry — must still
+                # leave a trace, or a bad config looks like an empty pool.
+                logger.error("Unexpected error fetching token for %s (server %s): %r",
+                             user.get('uid', '<unknown>') if isinstance(user, dict) else user,
+                             server_key, result)
+
+        # The lock is only held for the cache write, never around network I/O.
+        with self._lock_for(server_key):
             if tokens:
                 self.cache[server_key] = tokens
-                logger.info(f"Refreshed tokens for {server_key}. Count: {len(tokens)}")
+                # Build the finished header dict once per token here, so the
+                # per-request fan-out never formats or allocates headers.
+                self.headers_cache[server_key] = [get_headers(token) for token in tokens]
+                logger.info("Refreshed tokens for %s. Count: %d", server_key, len(tokens))
             else:
-                logger.warning(f"No valid tokens retrieved for {server_key}. Clearing cache for this server.")
-                self.cache[server_key] = []
-
-        except Exception as e:
-            logger.error(f"Critical error during token refresh for {server_key}: {str(e)}")
-            if server_key not in self.cache:
+                logger.warning("No valid tokens retrieved for %s. Clearing cache for this server.", server_key)
                 self.cache[server_key] = []
+                self.headers_cache[server_key] = []
 
     def _load_credentials(self, server_key):
         try:
+            cached = self._creds_cache.get(server_key)
+
             config_data = os.getenv(f"{server_key}_CONFIG")
             if config_data:
-                return json.loads(config_data)
+                if cached is not None and cached[0] == -1:
+                    return cached[1]
+                creds = orjson.loads(config_data)
+                self._creds_cache[server_key] = (-1, creds)
+                return creds
 
-            config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', f'{server_key.lower()}_config.json')
-            if os.path.exists(config_path):
-                with open(config_path, 'r') as f:
-                    return json.load(f)
-            else:
-                logger.warning(f"Config file not found for {server_key}: {config_path}. No credentials loaded.")
-                return []
+            config_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config')
+            base = os.path.join(config_dir, f'{server_key.lower()}_config')
+
+            # Packed protobuf config (optionally zstd-compressed) parses much
+            # faster than JSON for large credential lists; JSON stays as the
+            # ops-friendly fallback.
+            for config_path in (f'{base}.pb.zst', f'{base}.pb', f'{base}.json'):
+                try:
+                    mtime = os.stat(config_path).st_mtime
+                except OSError:
+                    continue
+                if config_path.endswith('.pb.zst') and zstandard is None:
+                    continue
+
+                if cached is not None and cached[0] == (config_path, mtime):
+                    return cached[1]
+                with open(config_path, 'rb') as f:
+                    raw = f.read()
+                if config_path.endswith('.json'):
+                    creds = orjson.loads(raw)
+                else:
+                    if config_path.endswith('.zst'):
+                        raw = zstandard.ZstdDecompressor().decompress(raw)
+                    msg = creds_pb2.CredsList()
+                    msg.ParseFromString(raw)
+                    creds = [{'uid': c.uid, 'password': c.password} for c in msg.creds]
+                self._creds_cache[server_key] = ((config_path, mtime), creds)
+                return creds
+
+            logger.warning("Config file not found for %s: %s.(pb.zst|pb|json). No credentials loaded.", server_key, base)
+            return []
         except Exception as e:
-            logger.error(f"Error loading credentials for {server_key}: {str(e)}")
+            logger.error("Error loading credentials for %s: %s", server_key, e)
             return []
 
 def get_headers(token: str):
-    return {
+    return CIMultiDict({
         'User-Agent': "Dalvik/2.1.0 (Linux; U; Android 9; ASUS_Z01QD Build/PI)",
         'Connection': "Keep-Alive",
         'Accept-Encoding': "gzip",
@@ -100,4 +235,4 @@ def get_headers(token: str):
         "X-Unity-Version": "2018.4.11f1",
         "X-GA": "v1 1",
         "ReleaseVersion": "OB51"
-    }
+    })
@@ -1,12 +1,16 @@
 # app/crypto_utils.py
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
-import binascii
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-def encrypt_aes(data: bytes) -> str:
-    key = b'Yg&tc%DEuh6%Zc^8'
-    iv = b'6oyZDr22E3ychjM%'
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    padded = pad(data, AES.block_size)
-    encrypted = cipher.encrypt(padded)
-    return binascii.hexlify(encrypted).decode()
\ No newline at end of file
+_KEY = b'Yg&tc%DEuh6%Zc^8'
+_IV = b'6oyZDr22E3ychjM%'
+
+# The key and IV are static, so the AES key schedule is expanded once here;
+# encryptor() per call is cheap and OpenSSL uses AES-NI automatically.
+_CIPHER = Cipher(algorithms.AES(_KEY), modes.CBC(_IV))
+
+def encrypt_aes(data: bytes) -> bytes:
+    padder = padding.PKCS7(algorithms.AES.block_size).padder()
+    padded = padder.update(data) + padder.finalize()
+    encryptor = _CIPHER.encryptor()
+    return encryptor.update(padded) + encryptor.finalize()
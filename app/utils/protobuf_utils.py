@@ -3,6 +3,7 @@ import app.protobuf.uid_generator_pb2 as uid_generator_pb2
 import app.protobuf.like_pb2 as like_pb2
 import app.protobuf.like_count_pb2 as like_count_pb2
 from google.protobuf.message import DecodeError
+import binascii
 import logging
 from .crypto_utils import encrypt_aes # Import relatif puisque crypto_utils.py est dans le même dossier
 
@@ -20,7 +21,7 @@ def create_protobuf(uid: str, region=None):
     return msg.SerializeToString()
 
 def encode_uid(uid: str) -> str:
-    return encrypt_aes(create_protobuf(uid))
+    return binascii.hexlify(encrypt_aes(create_protobuf(uid))).decode()
 
 def decode_info(data: bytes):
     try: